@@ -34,7 +34,7 @@ The information includes:
 - contact persons
 - organizations
 - data portal website and QR code if available
-- data availability
+- data availability (timeline of the time periods in the data table)
 - terms of data usage
 - data table including
   - name: short name or acronym
@@ -114,11 +114,21 @@ below:
 
 import os
 import sys
+import io
+import re
+import hashlib
+import warnings
+import multiprocessing
+import datetime
 
 import json
 
 import argparse
 
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, \
+    wait, FIRST_COMPLETED
+
 import numpy as np
 
 import matplotlib as mpl
@@ -126,6 +136,7 @@ import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes, InsetPosition
 from matplotlib.gridspec import GridSpec
+from matplotlib.collections import PolyCollection
 
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
@@ -136,9 +147,87 @@ from pylatex import Document, Section, Subsection, Command, \
     MiniPage, Figure, Tabular, LongTable, MultiColumn
 from pylatex.utils import italic, NoEscape
 
+from PIL import Image
+
 # Parameters
 DPI = 300
 
+# Card layout, widths in cm or as fractions of the parent width
+TEXT_WIDTH = 19.0
+MAP_BOX_WIDTH = 0.63
+MAP_BOX_RULE = 0.05  # tcolorbox boxrule, boxsep and left/right space
+MAP_BOX_SEP = 0.1
+MAP_BOX_SPACE = 0.4
+MAP_BOX_PADDING = 2 * (MAP_BOX_RULE + MAP_BOX_SEP + MAP_BOX_SPACE)
+MAP_WIDTH = 0.5
+
+# Optimized images embedded in the card
+ASSET_CACHE = './.card_assets'
+ASSET_VERSION = 1
+ASSET_PALETTE_SIZE = 256
+ASSET_FLAT_FRACTION = 0.8  # pixel fraction of top palette colors for PNG
+ASSET_JPEG_QUALITY = 90
+
+# Maximum height (cm) of the data availability timeline
+TIMELINE_MAX_HEIGHT = 10.0
+
+# Time ranges like 1996.01.01 - 2012.05, open ended or ending with now. A
+# range starts the text or follows a space, ( or , and its years are in
+# 1800-2199, so model numbers like LI-7500 or TSI 3010 - 3025 are not ranges.
+TIME_RANGE_PATTERN = re.compile( \
+  r'(?:^|(?<=[\s(,]))((?:18|19|20|21)\d{2}(?:\.\d{1,2}){0,2})(?![\d.])' + \
+  r'\s*-\s*((?:18|19|20|21)\d{2}(?:\.\d{1,2}){0,2}(?![\d.])|now)?(?!\s*\d)', \
+  re.IGNORECASE)
+
+# Mean earth radius (km)
+EARTH_RADIUS = 6371.0
+
+# Station catalog
+CATALOG_MAGIC = b'STCATLG2'
+
+# Text fields of a station, stored as ids in the catalog string table
+CATALOG_FIELDS = [
+  'name', 'long_name', 'country', 'location', 'time_zone', 'height',
+  'latitude', 'longitude', 'description', 'website', 'organization',
+  'contact', 'data_portal', 'data_usage_terms', 'note', 'version',
+  ]
+
+# Columns of the data table
+CATALOG_DATA_FIELDS = [
+  'name', 'method', 'height', 'time_resolution', 'time_period', 'site',
+  ]
+
+# Tables of single key-value pairs, card key and catalog section name
+CATALOG_PAIR_TABLES = {
+  'sites': 'sites',
+  'acronym_table': 'acronym',
+  'reference': 'reference',
+  }
+
+# Tables of a station, the presence of each one is stored as a bit flag
+CATALOG_TABLES = ['data_table'] + list(CATALOG_PAIR_TABLES)
+
+# Sections in the catalog file with their dtypes and number of columns, the
+# file header stores the offset and number of rows of each section
+CATALOG_SECTIONS = [
+  ('latitude'          , '<f8', 1),
+  ('longitude'         , '<f8', 1),
+  ('height'            , '<f8', 1),
+  ('path'              , '<i4', 1),
+  ('fields'            , '<i4', len(CATALOG_FIELDS)),
+  ('tables'            , '<u1', 1),
+  ('sites_offsets'     , '<i8', 1),
+  ('sites'             , '<i4', 2),
+  ('data_offsets'      , '<i8', 1),
+  ('data'              , '<i4', len(CATALOG_DATA_FIELDS)),
+  ('acronym_offsets'   , '<i8', 1),
+  ('acronym'           , '<i4', 2),
+  ('reference_offsets' , '<i8', 1),
+  ('reference'         , '<i4', 2),
+  ('string_offsets'    , '<i8', 1),
+  ('string_data'       , '<u1', 1),
+  ]
+
 
 class MarkSite:
   def __init__(self, nsite, fpath_in, fpath_out):
@@ -252,6 +341,18 @@ class StationCard():
       self.card_json = json.load(f)
 
 
+  @classmethod
+  def from_dict(cls, card_json, card_path=None):
+    """
+    " Create a card from already loaded station information, e.g., a view
+    " from a station catalog.
+    """
+    card = cls.__new__(cls)
+    card.card_path = card_path
+    card.card_json = card_json
+    return card
+
+
   def prepare_country_map(self, fabspath='./country_map.png'):
 
     #
@@ -362,6 +463,72 @@ class StationCard():
     plt.close()
 
 
+  def prepare_timeline(self, fabspath='./timeline.pdf', now=None):
+    #
+    # Data availability of all the variables in the data table
+    #
+    if now is None:
+      now = _date_to_year(datetime.date.today())
+
+    # Bars of available periods, each split at the changes of height or
+    # method, e.g., a new instrument, shown as alternating shades
+    x0, x1, y, shade = [], [], [], []
+    names = []
+    for i, d in enumerate(self.card_json.get('data_table', [])):
+      names.append(d['name'])
+      changes = np.concatenate([ \
+        parse_time_period(d.get('height'), now)[1:, 0], \
+        parse_time_period(d.get('method'), now)[1:, 0]])
+      for t0, t1 in parse_time_period(d.get('time_period'), now):
+        edges = np.unique(np.concatenate( \
+          [[t0, t1], changes[(changes > t0) & (changes < t1)]]))
+        x0.extend(edges[:-1])
+        x1.extend(edges[1:])
+        y.extend([i] * (len(edges) - 1))
+        shade.extend(np.arange(len(edges) - 1) % 2)
+
+    # Rectangles of all the bars in one collection
+    x0, x1, y = np.array(x0), np.array(x1), np.array(y, dtype=float)
+    verts = np.stack([ \
+      np.column_stack([x0, y - 0.35]), np.column_stack([x0, y + 0.35]), \
+      np.column_stack([x1, y + 0.35]), np.column_stack([x1, y - 0.35]), \
+      ], axis=1).reshape(-1, 4, 2)
+    colors = np.array(['steelblue', 'lightsteelblue'])[ \
+      np.array(shade, dtype=int)]
+
+    # Create a figure as wide as the card text, the height is limited so it
+    # fits in the card, then the rows and labels are squeezed
+    nrow = len(names)
+    height = min(0.5 + 0.15*max(nrow, 1), TIMELINE_MAX_HEIGHT/2.54)
+    fontsize = min(6.0, (height - 0.5) / max(nrow, 1) * 72 * 0.9)
+    label_step = int(np.ceil(3.0 / fontsize))
+    fontsize = max(fontsize, 3.0)
+    fg, ax = plt.subplots(1, 1, figsize=(TEXT_WIDTH/2.54, height), \
+      layout='constrained')
+
+    ax.add_collection(PolyCollection(verts, facecolors=colors, \
+      edgecolors='none'))
+
+    xmin = x0.min() if len(x0) > 0 else now - 1.0
+    ax.set_xlim(np.floor(xmin), np.ceil(now))
+    ax.set_ylim(max(nrow, 1) - 0.5, -0.5)
+    ax.set_yticks(np.arange(0, nrow, label_step))
+    ax.set_yticklabels(names[::label_step], fontsize=fontsize)
+    ax.tick_params(axis='x', labelsize=6)
+    ax.grid(axis='x', color='gray', alpha=0.5, linestyle='--', linewidth=0.5)
+    ax.set_axisbelow(True)
+
+    # Save the figure as vector graphics, to a temporary file first so a
+    # cached timeline is never partly written
+    fpath_base, ext = os.path.splitext(fabspath)
+    fpath_tmp = '{0}.{1}.tmp{2}'.format(fpath_base, os.getpid(), ext)
+    fg.savefig(fpath_tmp)
+    os.replace(fpath_tmp, fabspath)
+
+    # Close the figure
+    plt.close(fg)
+
+
   def prepare_local_map(self, fpath_local_map, fpath_local_map_new):
     nsite = len(self.card_json['sites'])
     ms = MarkSite(nsite, fpath_local_map, fpath_local_map_new)
@@ -460,6 +627,731 @@ class StationCard():
     fg.savefig(fabspath, dpi=DPI)
 
 
+def positive_int(text):
+  """
+  " Argument type of a positive integer.
+  """
+  try:
+    value = int(text)
+  except ValueError:
+    value = 0
+  if value < 1:
+    raise argparse.ArgumentTypeError( \
+      'should be a positive integer: {0}'.format(text))
+  return value
+
+
+def find_card_jsons(paths):
+  """
+  " Get the station json files from a list of files and directories, the
+  " directories are searched recursively.
+  """
+  fpaths = []
+  for p in paths:
+    if os.path.isdir(p):
+      for root, dirs, files in os.walk(p):
+        dirs.sort()
+        for f in sorted(files):
+          if f.endswith('.json'):
+            fpaths.append(os.path.join(root, f))
+    else:
+      fpaths.append(p)
+  return fpaths
+
+
+def _to_float(text):
+  try:
+    return float(text)
+  except (TypeError, ValueError):
+    return np.nan
+
+
+def _align(offset, nbyte=8):
+  return (offset + nbyte - 1) // nbyte * nbyte
+
+
+def _decimal_year(text, end=False):
+  """
+  " Convert a date like 1996, 1996.01 or 1996.01.20 to a decimal year, the
+  " end of the given year/month/day is used if end is True.
+  """
+  parts = [int(p) for p in text.split('.')]
+  year, month, day = (parts + [1, 1])[:3]
+  start = datetime.date(year, month, day)
+  if end:
+    if len(parts) == 1:
+      start = datetime.date(year+1, 1, 1)
+    elif len(parts) == 2:
+      start = datetime.date(year + month//12, month%12 + 1, 1)
+    else:
+      start = start + datetime.timedelta(days=1)
+  return _date_to_year(start)
+
+
+def _date_to_year(date):
+  ndays = (datetime.date(date.year+1, 1, 1) - \
+    datetime.date(date.year, 1, 1)).days
+  return date.year + (date.timetuple().tm_yday - 1) / ndays
+
+
+def parse_time_period(text, now=None):
+  """
+  " Parse the time ranges in a text into an array of (start, end) in decimal
+  " years, e.g., '1996.01.01 - ' or '16 (1998.04 - 2017.01), 35 (2017.02 - )'.
+  " The open ranges or the ranges ending with 'now' end at now (default
+  " today). The ranges with invalid dates, e.g., 1996.13, are skipped.
+  """
+  if now is None:
+    now = _date_to_year(datetime.date.today())
+
+  intervals = []
+  text = '' if text is None else str(text)
+  for start, end in TIME_RANGE_PATTERN.findall(text):
+    try:
+      t0 = _decimal_year(start)
+      t1 = _decimal_year(end, end=True) if end[:1].isdigit() else now
+    except ValueError:
+      continue
+    intervals.append((t0, max(t0, t1)))
+
+  return np.array(intervals, dtype=float).reshape(-1, 2)
+
+
+class CatalogRecord(Mapping):
+  """
+  " Station information of one station in a catalog, it can be used in place
+  " of the card_json dict. The values are only decoded from the catalog when
+  " they are accessed.
+  """
+  def __init__(self, catalog, istation):
+    self.catalog = catalog
+    self.istation = istation
+
+
+  def _has_table(self, key):
+    flags = self.catalog.sections['tables'][self.istation]
+    return bool(flags & (1 << CATALOG_TABLES.index(key)))
+
+
+  def _pair_table(self, section):
+    offsets = self.catalog.sections[section + '_offsets']
+    rows = self.catalog.sections[section][ \
+      offsets[self.istation]:offsets[self.istation+1]]
+    return [ {self.catalog.string(k): self.catalog.string(v)} \
+      for k, v in rows ]
+
+
+  def __getitem__(self, key):
+    if key in CATALOG_FIELDS:
+      sid = self.catalog.sections['fields'][ \
+        self.istation, CATALOG_FIELDS.index(key)]
+      if sid < 0:
+        raise KeyError(key)
+      return self.catalog.string(sid)
+
+    if key in CATALOG_TABLES and not self._has_table(key):
+      raise KeyError(key)
+
+    if key in CATALOG_PAIR_TABLES:
+      return self._pair_table(CATALOG_PAIR_TABLES[key])
+
+    if key == 'data_table':
+      offsets = self.catalog.sections['data_offsets']
+      rows = self.catalog.sections['data'][ \
+        offsets[self.istation]:offsets[self.istation+1]]
+      return [ {f: self.catalog.string(sid) \
+        for f, sid in zip(CATALOG_DATA_FIELDS, row) if sid >= 0} \
+        for row in rows ]
+
+    raise KeyError(key)
+
+
+  def __iter__(self):
+    fields = self.catalog.sections['fields'][self.istation]
+    for f, sid in zip(CATALOG_FIELDS, fields):
+      if sid >= 0:
+        yield f
+    for key in CATALOG_TABLES:
+      if self._has_table(key):
+        yield key
+
+
+  def __len__(self):
+    return sum(1 for key in self)
+
+
+class StationCatalog():
+  """
+  " A compact binary catalog of many stations.
+  "
+  " The station json files are compiled into one file which is memory mapped
+  " when it is loaded, so no json is parsed. Coordinates and heights are
+  " stored as columnar arrays, every text is stored once in a string table,
+  " and the variable-length tables (sites, data table, acronyms, references)
+  " are stored as rows of string ids with the row offsets of each station.
+  " Only the fields listed in CATALOG_FIELDS and the tables are kept, and
+  " all the values are stored as text. The json paths are stored relative to
+  " the catalog file.
+  """
+  def __init__(self, fpath_catalog):
+    self.catalog_path = fpath_catalog
+    self.buffer = np.memmap(fpath_catalog, dtype=np.uint8, mode='r')
+
+    if self.buffer[:len(CATALOG_MAGIC)].tobytes() != CATALOG_MAGIC:
+      raise ValueError( \
+        '{0} is not a station catalog file'.format(fpath_catalog))
+
+    # Read the section directory from the header
+    nsec = len(CATALOG_SECTIONS)
+    directory = np.frombuffer(self.buffer, dtype='<u8', count=2*nsec, \
+      offset=len(CATALOG_MAGIC)).reshape(nsec, 2)
+
+    # Array views of all the sections
+    self.sections = {}
+    for (name, dtype, ncol), (offset, nrow) in \
+        zip(CATALOG_SECTIONS, directory):
+      a = np.frombuffer(self.buffer, dtype=dtype, count=int(nrow)*ncol, \
+        offset=int(offset))
+      if ncol > 1:
+        a = a.reshape(int(nrow), ncol)
+      self.sections[name] = a
+
+    self.latitude  = self.sections['latitude' ]
+    self.longitude = self.sections['longitude']
+    self.height    = self.sections['height'   ]
+
+
+  @staticmethod
+  def is_catalog(fpath):
+    if not os.path.isfile(fpath):
+      return False
+    with open(fpath, 'rb') as f:
+      return f.read(len(CATALOG_MAGIC)) == CATALOG_MAGIC
+
+
+  @staticmethod
+  def build(fpath_catalog, fpath_card_jsons):
+    # String table, every text is only stored once, other values are stored
+    # as their json text
+    strings = {}
+    def string_id(value, where=None):
+      if value is None:
+        return -1
+      if not isinstance(value, str):
+        if isinstance(value, (list, dict)):
+          warnings.warn('{0}: {1} is not a scalar, stored as json text' \
+            .format(fpath, where))
+        value = json.dumps(value, ensure_ascii=False)
+      return strings.setdefault(value, len(strings))
+
+    # Json paths relative to the catalog file
+    dpath_catalog = os.path.dirname(os.path.abspath(fpath_catalog))
+
+    nstation = len(fpath_card_jsons)
+    arrays = {
+      'latitude' : np.full(nstation, np.nan),
+      'longitude': np.full(nstation, np.nan),
+      'height'   : np.full(nstation, np.nan),
+      'path'     : np.zeros(nstation, dtype=np.int32),
+      'fields'   : np.full((nstation, len(CATALOG_FIELDS)), -1, \
+        dtype=np.int32),
+      'tables'   : np.zeros(nstation, dtype=np.uint8),
+      }
+    rows = {'data': []}
+    for section in CATALOG_PAIR_TABLES.values():
+      rows[section] = []
+    for section in rows:
+      arrays[section + '_offsets'] = np.zeros(nstation+1, dtype=np.int64)
+
+    for i, fpath in enumerate(fpath_card_jsons):
+      with open(fpath) as f:
+        card_json = json.load(f)
+
+      arrays['latitude' ][i] = _to_float(card_json.get('latitude' ))
+      arrays['longitude'][i] = _to_float(card_json.get('longitude'))
+      arrays['height'   ][i] = _to_float(card_json.get('height'   ))
+      arrays['path'][i] = string_id( \
+        os.path.relpath(os.path.abspath(fpath), dpath_catalog))
+      for j, f in enumerate(CATALOG_FIELDS):
+        arrays['fields'][i, j] = string_id(card_json.get(f), f)
+
+      dropped = set(card_json) - set(CATALOG_FIELDS) - set(CATALOG_TABLES)
+      for d in card_json.get('data_table', []):
+        dropped |= set('data_table.' + f for f in d) - \
+          set('data_table.' + f for f in CATALOG_DATA_FIELDS)
+        rows['data'].append([string_id(d.get(f), 'data_table.' + f) \
+          for f in CATALOG_DATA_FIELDS])
+      for key, section in CATALOG_PAIR_TABLES.items():
+        for p in card_json.get(key, []):
+          for k, v in p.items():
+            rows[section].append([string_id(k, key), string_id(v, key)])
+      if dropped:
+        warnings.warn('{0}: {1} not kept in the catalog'.format( \
+          fpath, ', '.join(sorted(dropped))))
+
+      for t, key in enumerate(CATALOG_TABLES):
+        if key in card_json:
+          arrays['tables'][i] |= 1 << t
+
+      for section in rows:
+        arrays[section + '_offsets'][i+1] = len(rows[section])
+
+    ncols = {name: ncol for name, dtype, ncol in CATALOG_SECTIONS}
+    for section, r in rows.items():
+      arrays[section] = np.array(r, dtype=np.int32) \
+        .reshape(len(r), ncols[section])
+
+    # Concatenate all the strings with their offsets
+    encoded = [s.encode('utf-8') for s in strings]
+    arrays['string_offsets'] = np.zeros(len(encoded)+1, dtype=np.int64)
+    arrays['string_offsets'][1:] = np.cumsum([len(b) for b in encoded])
+    arrays['string_data'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    # Place the sections after the header, each aligned to 8 bytes
+    nsec = len(CATALOG_SECTIONS)
+    directory = np.zeros((nsec, 2), dtype='<u8')
+    offset = _align(len(CATALOG_MAGIC) + directory.nbytes)
+    for i, (name, dtype, ncol) in enumerate(CATALOG_SECTIONS):
+      arrays[name] = np.ascontiguousarray(arrays[name], dtype=dtype)
+      directory[i] = (offset, arrays[name].shape[0])
+      offset = _align(offset + arrays[name].nbytes)
+
+    # Write to a temporary file first, the old catalog may still be memory
+    # mapped by other processes
+    fpath_tmp = '{0}.{1}.tmp'.format(fpath_catalog, os.getpid())
+    with open(fpath_tmp, 'wb') as f:
+      f.write(CATALOG_MAGIC)
+      f.write(directory.tobytes())
+      for i, (name, dtype, ncol) in enumerate(CATALOG_SECTIONS):
+        f.write(b'\0' * (int(directory[i, 0]) - f.tell()))
+        f.write(arrays[name].tobytes())
+    os.replace(fpath_tmp, fpath_catalog)
+
+
+  def string(self, sid):
+    if sid < 0:
+      return None
+    offsets = self.sections['string_offsets']
+    return self.sections['string_data'][offsets[sid]:offsets[sid+1]] \
+      .tobytes().decode('utf-8')
+
+
+  @property
+  def names(self):
+    i = CATALOG_FIELDS.index('name')
+    return [self.string(sid) for sid in self.sections['fields'][:, i]]
+
+
+  def index(self, name):
+    return self.names.index(name)
+
+
+  def __len__(self):
+    return len(self.latitude)
+
+
+  def __getitem__(self, istation):
+    if istation < 0:
+      istation += len(self)
+    if not 0 <= istation < len(self):
+      raise IndexError('station index out of range')
+    fpath = os.path.join( \
+      os.path.dirname(os.path.abspath(self.catalog_path)), \
+      self.string(self.sections['path'][istation]))
+    return StationCard.from_dict(CatalogRecord(self, istation), \
+      os.path.normpath(fpath))
+
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+
+
+def load_fleet(paths):
+  """
+  " Load the stations from a catalog file, or from json files and directories.
+  """
+  if len(paths) == 1 and StationCatalog.is_catalog(paths[0]):
+    return StationCatalog(paths[0])
+  return [StationCard(p) for p in find_card_jsons(paths)]
+
+
+def haversine(lat1, lon1, lat2, lon2):
+  """
+  " Great-circle distance (km) between points given in degrees, the inputs
+  " can be numpy arrays.
+  """
+  lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+  a = np.sin(0.5*(lat2 - lat1))**2 + \
+    np.cos(lat1) * np.cos(lat2) * np.sin(0.5*(lon2 - lon1))**2
+  return 2.0 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class BallTree():
+  """
+  " Ball tree of points on the earth with the haversine distance.
+  "
+  " Each node is a ball with a center and a radius (km) covering the points
+  " indices[start:end]. The points are split at the median along the axis with
+  " the largest spread of their unit vectors, so the longitude wrapping at
+  " +-180 degrees is not a problem.
+  """
+  def __init__(self, lat, lon, leaf_size=16):
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    self.leaf_size = leaf_size
+
+    # Points without valid coordinates are not put in the tree
+    self.indices = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    self.lat = lat
+    self.lon = lon
+
+    # Unit vectors of the points
+    rlat, rlon = np.radians(lat), np.radians(lon)
+    self.xyz = np.column_stack( \
+      (np.cos(rlat)*np.cos(rlon), np.cos(rlat)*np.sin(rlon), np.sin(rlat)))
+
+    # Nodes: start, end, left child, right child (-1 for leaves), center
+    # latitude, center longitude and radius
+    self.nodes = []
+    if len(self.indices) > 0:
+      self._build(0, len(self.indices))
+
+
+  def _build(self, start, end):
+    idx = self.indices[start:end]
+    xyz = self.xyz[idx]
+
+    # Center is the normalized mean of unit vectors
+    c = xyz.mean(axis=0)
+    norm = np.linalg.norm(c)
+    c = c / norm if norm > 0 else xyz[0]
+    clat = np.degrees(np.arcsin(np.clip(c[2], -1.0, 1.0)))
+    clon = np.degrees(np.arctan2(c[1], c[0]))
+    radius = haversine(clat, clon, self.lat[idx], self.lon[idx]).max()
+
+    inode = len(self.nodes)
+    self.nodes.append([start, end, -1, -1, clat, clon, radius])
+
+    if end - start > self.leaf_size:
+      axis = np.argmax(xyz.max(axis=0) - xyz.min(axis=0))
+      mid = (end - start) // 2
+      order = np.argpartition(xyz[:, axis], mid)
+      self.indices[start:end] = idx[order]
+      self.nodes[inode][2] = self._build(start, start + mid)
+      self.nodes[inode][3] = self._build(start + mid, end)
+
+    return inode
+
+
+  def query_radius(self, lat, lon, radius):
+    """
+    " Get the indices of points within the radius (km), sorted by the
+    " distances which are also returned.
+    """
+    found = []
+    stack = [0] if self.nodes else []
+    while stack:
+      start, end, left, right, clat, clon, r = self.nodes[stack.pop()]
+      d = haversine(lat, lon, clat, clon)
+      if d - r > radius:
+        continue
+      idx = self.indices[start:end]
+      if d + r <= radius or left < 0:
+        found.append(idx)
+      else:
+        stack.extend([left, right])
+
+    if not found:
+      return np.array([], dtype=int), np.array([])
+
+    idx = np.concatenate(found)
+    dist = haversine(lat, lon, self.lat[idx], self.lon[idx])
+    keep = dist <= radius
+    order = np.argsort(dist[keep], kind='stable')
+    return idx[keep][order], dist[keep][order]
+
+
+def _normalize_value(value):
+  return ' '.join(str(value).split())
+
+
+class StationIndex():
+  """
+  " Query stations by location and by their data table.
+  "
+  " A ball tree is used for the spatial queries, and an inverted index maps
+  " each field value of the data table rows to the rows having it, so rows
+  " matching several fields are found by intersecting the row sets.
+  "
+  " For a catalog, the index of a field is built from its string id column
+  " when the field is first queried, and only the distinct strings of the
+  " column are decoded.
+  """
+  def __init__(self, cards):
+    self.cards = cards
+    self.inverted = {}
+
+    if isinstance(cards, StationCatalog):
+      self.tree = BallTree(cards.latitude, cards.longitude)
+      self.row_station = np.repeat(np.arange(len(cards)), \
+        np.diff(cards.sections['data_offsets']))
+      return
+
+    lat = [_to_float(c.card_json.get('latitude' )) for c in cards]
+    lon = [_to_float(c.card_json.get('longitude')) for c in cards]
+    self.tree = BallTree(lat, lon)
+
+    # Inverted index: field -> value -> data rows; and station of each row
+    row_station = []
+    for i, c in enumerate(cards):
+      for d in c.card_json.get('data_table', []):
+        for f, v in d.items():
+          self.inverted.setdefault(f, {}) \
+            .setdefault(_normalize_value(v), []).append(len(row_station))
+        row_station.append(i)
+    self.row_station = np.array(row_station, dtype=int)
+
+
+  def _field_index(self, field):
+    if field in self.inverted or not isinstance(self.cards, StationCatalog):
+      return self.inverted.get(field, {})
+
+    index = self.inverted[field] = {}
+    if field not in CATALOG_DATA_FIELDS:
+      return index
+
+    # Group the rows by the string ids of the column
+    column = self.cards.sections['data'][:, CATALOG_DATA_FIELDS.index(field)]
+    sids, inverse, counts = np.unique(column, return_inverse=True, \
+      return_counts=True)
+    rows = np.split(np.argsort(inverse, kind='stable'), np.cumsum(counts)[:-1])
+    for sid, r in zip(sids, rows):
+      if sid >= 0:
+        index.setdefault(_normalize_value(self.cards.string(sid)), []) \
+          .extend(r.tolist())
+    return index
+
+
+  def find(self, name):
+    """
+    " Get the station index by its name or location.
+    """
+    if isinstance(self.cards, StationCatalog):
+      fields = self.cards.sections['fields']
+      names = self.cards.names
+      locations = [self.cards.string(sid) for sid in \
+        fields[:, CATALOG_FIELDS.index('location')]]
+    else:
+      names = [c.card_json.get('name') for c in self.cards]
+      locations = [c.card_json.get('location') for c in self.cards]
+
+    for i, (n, l) in enumerate(zip(names, locations)):
+      if name in (n, l):
+        return i
+    raise KeyError('station {0} is not found'.format(name))
+
+
+  def within(self, lat, lon, radius):
+    return self.tree.query_radius(lat, lon, radius)
+
+
+  def match(self, where):
+    """
+    " Get the stations having at least one data row matching all the fields,
+    " e.g., {'name': 'PNSD', 'time_resolution': '10 M'}.
+    """
+    rows = None
+    for f, v in where.items():
+      r = self._field_index(f).get(_normalize_value(v), [])
+      rows = np.asarray(r) if rows is None else np.intersect1d(rows, r)
+    if rows is None:
+      return np.arange(len(self.cards))
+    return np.unique(self.row_station[rows.astype(int)])
+
+
+  def query(self, near=None, radius=None, where=None):
+    """
+    " Get the station indices matching all the given conditions. near is a
+    " (latitude, longitude) pair or a station name, the results are sorted by
+    " the distance to it and limited to the radius (km) if it is given.
+    """
+    if near is not None:
+      if radius is None:
+        radius = np.inf
+      if isinstance(near, str):
+        i = self.find(near)
+        near = (_to_float(self.cards[i].card_json['latitude' ]), \
+          _to_float(self.cards[i].card_json['longitude']))
+      idx, dist = self.within(near[0], near[1], radius)
+    else:
+      idx = np.arange(len(self.cards))
+
+    if where:
+      idx = idx[np.isin(idx, self.match(where))]
+
+    return idx
+
+
+def optimize_image(fpath_image, width, dpi=DPI, cache_dir=ASSET_CACHE):
+  """
+  " Resample an image to its printed width (cm) at the given dpi, and save it
+  " as a palette PNG or a JPEG file, whichever suits the image. The optimized
+  " images are cached by the hash of the source image and the parameters, and
+  " the absolute path of the optimized image is returned. If the optimized
+  " image is not smaller, a marker is cached and the source image is used.
+  """
+  with open(fpath_image, 'rb') as f:
+    source = f.read()
+
+  key = hashlib.sha256(source)
+  key.update('{0}:{1:.4f}:{2}'.format(ASSET_VERSION, width, dpi).encode())
+  fpath_base = os.path.join(os.path.abspath(cache_dir), '{0}-{1}'.format( \
+    os.path.splitext(os.path.basename(fpath_image))[0], key.hexdigest()[:16]))
+
+  for ext in ('.png', '.jpg'):
+    if os.path.isfile(fpath_base + ext):
+      return fpath_base + ext
+  if os.path.isfile(fpath_base + '.src'):
+    return os.path.abspath(fpath_image)
+
+  img = Image.open(io.BytesIO(source))
+  img.load()
+
+  # Drop the alpha channel if the image is opaque
+  if img.mode in ('RGBA', 'LA', 'P'):
+    img = img.convert('RGBA')
+    if img.getchannel('A').getextrema()[0] == 255:
+      img = img.convert('RGB')
+  elif img.mode != 'RGB':
+    img = img.convert('RGB')
+
+  # Resample to the printed size, never upsample
+  npx = int(round(width / 2.54 * dpi))
+  if img.width > npx:
+    img = img.resize((npx, max(1, int(round(img.height*npx/img.width)))), \
+      Image.LANCZOS)
+
+  # Few colors, transparency or mostly flat colors (plots, annotated maps)
+  # suit a palette PNG, photos (satellite maps) suit a JPEG
+  colors = img.getcolors(maxcolors=img.width*img.height)
+  counts = np.sort(np.array([c[0] for c in colors]))[::-1]
+  flat = counts[:ASSET_PALETTE_SIZE].sum() / counts.sum()
+  if img.mode == 'RGBA' or flat >= ASSET_FLAT_FRACTION:
+    ext = '.png'
+    method = Image.FASTOCTREE if img.mode == 'RGBA' else Image.MEDIANCUT
+    out = img.quantize(colors=ASSET_PALETTE_SIZE, method=method)
+    save_args = {'optimize': True}
+  else:
+    ext = '.jpg'
+    out = img
+    save_args = {'quality': ASSET_JPEG_QUALITY, 'optimize': True}
+
+  # Save to a temporary file first since other tasks may read the cache
+  os.makedirs(cache_dir, exist_ok=True)
+  fpath_tmp = '{0}.{1}.tmp{2}'.format(fpath_base, os.getpid(), ext)
+  out.save(fpath_tmp, dpi=(dpi, dpi), **save_args)
+
+  # Keep the source image if it is already smaller
+  if os.path.getsize(fpath_tmp) >= len(source):
+    os.remove(fpath_tmp)
+    open(fpath_base + '.src', 'w').close()
+    return os.path.abspath(fpath_image)
+
+  os.replace(fpath_tmp, fpath_base + ext)
+  return fpath_base + ext
+
+
+class TaskGraph():
+  """
+  " Run tasks concurrently as soon as the tasks they depend on are finished.
+  "
+  " Tasks run on a thread pool, or on a process pool if added with
+  " process=True, which suits the CPU-bound plotting. A process task gets
+  " copies of its arguments, so it should only communicate through files or
+  " its return value. With max_workers=1 all the tasks run one by one in the
+  " order they are added.
+  "
+  " The pools are created when first needed and kept until close(), so one
+  " graph can run several batches of tasks, e.g., one batch per card. The
+  " worker processes are started by a fork server, since forking this
+  " process when the thread pool is running may deadlock.
+  """
+  def __init__(self, max_workers=None):
+    self.max_workers = max_workers
+    self.tasks = {}
+    self.results = {}
+    self.threads = None
+    self.processes = None
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+  def close(self):
+    if self.threads is not None:
+      self.threads.shutdown(wait=True)
+      self.threads = None
+    if self.processes is not None:
+      self.processes.shutdown(wait=True)
+      self.processes = None
+
+
+  def add(self, name, func, *args, deps=(), process=False):
+    for d in deps:
+      if d not in self.tasks:
+        raise ValueError('task {0} depends on unknown task {1}'.format(name, d))
+    self.tasks[name] = (func, args, tuple(deps), process)
+
+
+  def run(self):
+    """
+    " Run all the added tasks and return their results by task names, then
+    " the tasks are cleared for the next batch. The results are also kept in
+    " self.results, so a task can get the results of the tasks it depends on.
+    " The first exception raised by a task is raised again after the running
+    " tasks are finished.
+    """
+    results = self.results = {}
+    pending, self.tasks = self.tasks, {}
+
+    if self.max_workers == 1:
+      for name, (func, args, deps, process) in pending.items():
+        results[name] = func(*args)
+      return results
+
+    if self.threads is None:
+      self.threads = ThreadPoolExecutor(max_workers=self.max_workers)
+    if self.processes is None and any(t[3] for t in pending.values()):
+      self.processes = ProcessPoolExecutor(max_workers=self.max_workers, \
+        mp_context=multiprocessing.get_context('forkserver'))
+
+    running = {}
+    try:
+      while pending or running:
+        # Submit the tasks whose dependencies are all finished
+        for name, (func, args, deps, process) in list(pending.items()):
+          if all(d in results for d in deps):
+            pool = self.processes if process else self.threads
+            running[pool.submit(func, *args)] = name
+            del pending[name]
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+          results[running.pop(future)] = future.result()
+    finally:
+      for future in running:
+        future.cancel()
+      wait(running)
+
+    return results
+
+
 class CardDocument(Document):
   def __init__(self, card_json, **kwargs):
     super().__init__(**kwargs)
@@ -472,7 +1364,8 @@ class CardDocument(Document):
     # self.append(NoEscape(r'\maketitle'))
   
 
-  def fill_document(self, fpath_country_map, fpath_local_map):
+  def fill_document(self, fpath_country_map, fpath_local_map, \
+      fpath_timeline=None):
     #
     # Some parameters
     #
@@ -510,7 +1403,8 @@ class CardDocument(Document):
     self.preamble.append(NoEscape(r'\usepackage{tabularx}'))
     self.preamble.append(NoEscape(r'\usepackage{colortbl}'))
     self.preamble.append(NoEscape( \
-      r'\usepackage[textwidth=19cm,textheight=27.5cm]{geometry}'))
+      r'\usepackage[textwidth={0}cm,textheight=27.5cm]{{geometry}}'.format( \
+      TEXT_WIDTH)))
     self.preamble.append(NoEscape(r'\usepackage{underscore}'))
 
     # Modify page layout
@@ -546,10 +1440,10 @@ class CardDocument(Document):
     self.append(NoEscape(r'\newline'))
 
     # Map: global map, country/region map, local map
-    country_map_text = r'\includegraphics[width=0.5\linewidth]{{{0}}}'.format( \
-      fpath_country_map).replace('_', '\_')
-    local_map_text = r'\includegraphics[width=0.5\linewidth]{{{0}}}'.format( \
-      fpath_local_map).replace('_', '\_')
+    country_map_text = r'\includegraphics[width={0}\linewidth]{{{1}}}'.format( \
+      MAP_WIDTH, fpath_country_map).replace('_', '\_')
+    local_map_text = r'\includegraphics[width={0}\linewidth]{{{1}}}'.format( \
+      MAP_WIDTH, fpath_local_map).replace('_', '\_')
     # country_map_text = r'\includegraphics[width=0.5\linewidth]{{{0}}}'.format( \
     #   fpath_country_map)
     # local_map_text = r'\includegraphics[width=0.5\linewidth]{{{0}}}'.format( \
@@ -562,7 +1456,7 @@ class CardDocument(Document):
       if i < nsite - 1:
         sites_text += r'\newline'
 
-    self.append(NoEscape(r'\begin{tcolorbox}[title={MAP},equal height group=A,width=0.63\textwidth]'))
+    self.append(NoEscape(r'\begin{{tcolorbox}}[title={{MAP}},equal height group=A,width={0}\textwidth,boxrule={1}cm,boxsep={2}cm,left={3}cm,right={3}cm]'.format(MAP_BOX_WIDTH, MAP_BOX_RULE, MAP_BOX_SEP, MAP_BOX_SPACE)))
     self.append(NoEscape(country_map_text))
     self.append(NoEscape(local_map_text))
     self.append(NoEscape(sites_text))
@@ -613,6 +1507,14 @@ class CardDocument(Document):
 
     self.append(NoEscape(r'\end{tcolorbox}'))
 
+    # Data availability
+    if fpath_timeline is not None:
+      timeline_text = r'\includegraphics[width=\linewidth]{{{0}}}'.format( \
+        fpath_timeline).replace('_', '\_')
+      self.append(NoEscape(r'\begin{tcolorbox}[title={DATA AVAILABILITY}]'))
+      self.append(NoEscape(timeline_text))
+      self.append(NoEscape(r'\end{tcolorbox}'))
+
     # Acronym table
     self.append(NoEscape(r'\begin{tcolorbox}[title={ACRONYM TABLE},breakable,tabularx={@{\extracolsep{\fill}\hspace{2mm}}p{2.0cm}X|p{2.0cm}X@{\hspace{2mm}}},before upper pre={\rowcolors{2}{gray!40}{gray!10}}]'))
 
@@ -662,38 +1564,112 @@ def do_mark_parser(args):
   card.prepare_local_map(args.local_map_nomark[0], args.local_map_mark[0])
 
 
-def do_card_parser(args):
-  print('Generating station card ...')
-
-  # Set the card instance
-  card = StationCard(args.json_file[0])
-
-  # Plot country map with global map inside if it does not exist
-  print('- Preparing country map ...')
-  if not os.path.isfile(args.country_map[0]):
-    card.prepare_country_map(args.country_map[0])
-  
+def make_card(card, fpath_country_map, fpath_local_map, fpath_card='./card', \
+    jobs=None, asset_dpi=DPI, asset_cache=ASSET_CACHE, graph=None):
   #
-  # Create the card document
+  # Stages of the card, the maps with their optimized images and the data
+  # availability timeline are prepared concurrently, the document is filled
+  # with the optimized images, and the pdf compiling needs all of them
   #
-  
-  # print('Generating the final card pdf file ...')
-  
-  # Initiate
-  print('- Initiating document ...')
+  # pdf is compiled in the directory of the card, so the paths embedded in
+  # the document should not be relative to the current directory
+  fpath_country_map = os.path.abspath(fpath_country_map)
+  fpath_local_map = os.path.abspath(fpath_local_map)
+  fpath_card = os.path.abspath(fpath_card)
+  asset_cache = os.path.abspath(asset_cache)
+
   doc = CardDocument(
     card.card_json,
     documentclass='article',
     document_options=['a4paper', 'portrait']
     )
-  
-  # Call function to add text
-  print('- Filling document content ...')
-  doc.fill_document(args.country_map[0], args.local_map_mark[0])
-  
-  # Generate the pdf file
-  print('- Generating pdf file ...')
-  doc.generate_pdf('./card', clean_tex=False)
+
+  def check_local_map():
+    print('- Checking local map ...')
+    if not os.path.isfile(fpath_local_map):
+      raise FileNotFoundError( \
+        'local map {0} is not found, it can be generated by mark command' \
+        .format(fpath_local_map))
+
+  def fill_document():
+    print('- Filling document content ...')
+    doc.fill_document(graph.results['country_asset'], \
+      graph.results['local_asset'], fpath_timeline)
+
+  def generate_pdf():
+    print('- Generating pdf file ...')
+    doc.generate_pdf(fpath_card, clean_tex=False)
+
+  # A graph given by the caller keeps its worker pools for the next cards
+  close_graph = graph is None
+  if close_graph:
+    graph = TaskGraph(max_workers=jobs)
+
+  # Plot country map with global map inside if it does not exist, a plain
+  # dict copy of the card is sent to the worker process
+  if not os.path.isfile(fpath_country_map):
+    print('- Preparing country map ...')
+    graph.add('country_map', \
+      StationCard.from_dict(dict(card.card_json), card.card_path) \
+      .prepare_country_map, fpath_country_map, process=True)
+  else:
+    graph.add('country_map', lambda: None)
+
+  graph.add('local_map', check_local_map)
+
+  # Resample the maps to their printed width in the card, asset_dpi <= 0
+  # embeds the original images
+  map_width = (TEXT_WIDTH*MAP_BOX_WIDTH - MAP_BOX_PADDING) * MAP_WIDTH
+  for name, fpath in [('country', fpath_country_map), \
+      ('local', fpath_local_map)]:
+    if asset_dpi > 0:
+      graph.add(name + '_asset', optimize_image, fpath, map_width, \
+        asset_dpi, asset_cache, deps=[name + '_map'], process=True)
+    else:
+      graph.add(name + '_asset', lambda fpath=fpath: fpath, \
+        deps=[name + '_map'])
+
+  # Plot the data availability timeline, it is cached by the station, its
+  # data table and the date since the open periods end today. There is no
+  # timeline if no time period can be parsed.
+  data_table = list(card.card_json.get('data_table', []))
+  has_timeline = any(len(parse_time_period(d.get('time_period'))) > 0 \
+    for d in data_table)
+  fpath_json = card.card_path and os.path.abspath(card.card_path)
+  station_key = hashlib.sha256(json.dumps( \
+    [fpath_json, card.card_json['name']]).encode()).hexdigest()[:16]
+  key = hashlib.sha256(json.dumps( \
+    [data_table, datetime.date.today().isoformat()], \
+    sort_keys=True).encode())
+  fpath_timeline = os.path.join(asset_cache, \
+    'timeline-{0}-{1}.pdf'.format(station_key, key.hexdigest()[:16]))
+  if not has_timeline:
+    fpath_timeline = None
+    graph.add('timeline', lambda: None)
+  elif not os.path.isfile(fpath_timeline):
+    print('- Preparing data availability timeline ...')
+    os.makedirs(asset_cache, exist_ok=True)
+
+    # Remove the outdated timelines of the station
+    prefix = 'timeline-{0}-'.format(station_key)
+    for f in os.listdir(asset_cache):
+      if f.startswith(prefix) and f.endswith('.pdf'):
+        os.remove(os.path.join(asset_cache, f))
+
+    graph.add('timeline', \
+      StationCard.from_dict(dict(card.card_json), card.card_path) \
+      .prepare_timeline, fpath_timeline, process=True)
+  else:
+    graph.add('timeline', lambda: None)
+
+  graph.add('fill', fill_document, deps=['country_asset', 'local_asset'])
+  graph.add('pdf', generate_pdf, deps=['fill', 'timeline'])
+
+  try:
+    graph.run()
+  finally:
+    if close_graph:
+      graph.close()
   
   # The document as string in LaTeX syntax, output also the tex text, the path is
   # the same as the pdf file.
@@ -701,6 +1677,91 @@ def do_card_parser(args):
   tex = doc.dumps()
 
 
+def do_card_parser(args):
+  print('Generating station card ...')
+
+  # Set the card instance
+  card = StationCard(args.json_file[0])
+
+  make_card(card, args.country_map[0], args.local_map_mark[0], \
+    jobs=args.jobs, asset_dpi=args.asset_dpi, asset_cache=args.asset_cache)
+
+
+def do_query_parser(args):
+  # Load the stations and build the index
+  cards = load_fleet(args.fleet)
+  index = StationIndex(cards)
+
+  if args.radius is not None and args.near is None:
+    args.parser.error('--radius needs --near')
+
+  # Reference point, a station name/location or "lat,lon"
+  near = None
+  if args.near is not None:
+    try:
+      near = tuple(float(x) for x in args.near.split(','))
+    except ValueError:
+      near = args.near
+    if isinstance(near, tuple) and len(near) != 2:
+      args.parser.error( \
+        '--near should be a station name or "lat,lon": {0}'.format(args.near))
+    if isinstance(near, tuple) and \
+        not (abs(near[0]) <= 90.0 and abs(near[1]) <= 180.0):
+      args.parser.error( \
+        '--near should be in -90 to 90 and -180 to 180: {0}'.format(args.near))
+    if isinstance(near, str):
+      try:
+        index.find(near)
+      except KeyError:
+        args.parser.error('station {0} is not found'.format(near))
+
+  where = {}
+  for w in args.where:
+    f, sep, v = w.partition('=')
+    if not sep or not f.strip():
+      args.parser.error('--where should be field=value: {0}'.format(w))
+    where[f.strip()] = v
+
+  result = index.query(near, args.radius, where)
+
+  # Print the absolute json paths of found stations, one per line
+  for i in result:
+    print(os.path.abspath(cards[i].card_path))
+
+  # Generate the cards of found stations, the maps and the card are named after
+  # the json file in the same directory, and the cards share the worker pools.
+  # A failed card is reported and the other cards are still generated.
+  if args.card:
+    failed = []
+    with TaskGraph(max_workers=args.jobs) as graph:
+      for i in result:
+        card = cards[i]
+        fpath_base = os.path.splitext(card.card_path)[0]
+        print('Generating station card of {0} ...'.format(card.card_json['name']))
+        try:
+          make_card(card, fpath_base + '_country.png', \
+            fpath_base + '_local_mark.png', fpath_base + '_card', \
+            asset_dpi=args.asset_dpi, asset_cache=args.asset_cache, \
+            graph=graph)
+        except Exception as e:
+          print('- Failed: {0}'.format(e), file=sys.stderr)
+          failed.append(card.card_json['name'])
+
+    if failed:
+      sys.exit('Failed to generate the cards of {0} stations: {1}'.format( \
+        len(failed), ', '.join(failed)))
+
+
+def do_catalog_build_parser(args):
+  print('Building station catalog ...')
+
+  fpath_card_jsons = find_card_jsons(args.json_files)
+  print('- Compiling {0} station json files ...'.format(len(fpath_card_jsons)))
+  StationCatalog.build(args.catalog_file[0], fpath_card_jsons)
+
+  print('- Catalog saved to {0}'.format(args.catalog_file[0]))
+
+
 if __name__ == '__main__':
   #
   # Set the arguments
@@ -742,8 +1803,71 @@ if __name__ == '__main__':
     nargs=1,
     help="the path of local map with marks, it can be generated by mark command"
     )
+  card_parser.add_argument('--jobs',
+    type=positive_int, default=4,
+    help="the number of workers running the card stages concurrently, 1 runs them one by one"
+    )
+  card_parser.add_argument('--asset-dpi',
+    type=float, default=DPI,
+    help="the effective dpi of the map images embedded in the card, 0 embeds the original images"
+    )
+  card_parser.add_argument('--asset-cache',
+    default=ASSET_CACHE,
+    help="the directory caching the optimized map images"
+    )
   card_parser.set_defaults(func=do_card_parser)
 
+  # subparser: catalog
+  catalog_parser = subparsers.add_parser('catalog', help='manage a compact binary catalog of stations')
+  catalog_subparsers = catalog_parser.add_subparsers(required=True)
+
+  # subparser: catalog build
+  catalog_build_parser = catalog_subparsers.add_parser('build', help='compile station json files into one catalog file')
+  catalog_build_parser.add_argument('catalog_file',
+    nargs=1,
+    help="the path of the catalog file to be saved"
+    )
+  catalog_build_parser.add_argument('json_files',
+    nargs='+',
+    help="the paths of json files or directories containing json files"
+    )
+  catalog_build_parser.set_defaults(func=do_catalog_build_parser)
+
+  # subparser: query
+  query_parser = subparsers.add_parser('query', help='query stations by location and data table')
+  query_parser.add_argument('fleet',
+    nargs='+',
+    help="the path of a catalog file, or paths of json files or directories containing json files"
+    )
+  query_parser.add_argument('--near',
+    help="a station name or location, or \"lat,lon\" in degrees"
+    )
+  query_parser.add_argument('--radius',
+    type=float,
+    help="the distance (km) to the --near point within which the stations are found, all stations sorted by the distance if not given"
+    )
+  query_parser.add_argument('--where',
+    action='append', default=[],
+    help="field=value of a data table row, e.g., name=PNSD, can be repeated and all of them should match the same row"
+    )
+  query_parser.add_argument('--card',
+    action='store_true',
+    help="generate the cards of found stations, maps are named as <json name>_country.png and <json name>_local_mark.png"
+    )
+  query_parser.add_argument('--jobs',
+    type=positive_int, default=4,
+    help="the number of workers running the card stages concurrently, 1 runs them one by one"
+    )
+  query_parser.add_argument('--asset-dpi',
+    type=float, default=DPI,
+    help="the effective dpi of the map images embedded in the card, 0 embeds the original images"
+    )
+  query_parser.add_argument('--asset-cache',
+    default=ASSET_CACHE,
+    help="the directory caching the optimized map images"
+    )
+  query_parser.set_defaults(func=do_query_parser, parser=query_parser)
+
   # Start to parse the arguments
   args=parser.parse_args()
 